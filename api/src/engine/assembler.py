@@ -1,55 +1,146 @@
-from typing import Dict, List, Deque, Optional
+from typing import Callable, Dict, List, Deque, Optional, Set, Tuple
 from datetime import datetime
 from collections import deque
+import bisect
+import heapq
+import math
 import time
 import logging
 
 logger = logging.getLogger("aiops-assembler")
 
+def event_time(event: dict) -> Optional[float]:
+    """Event-time of an audit event in epoch seconds, from its 'ts' (number or ISO string)."""
+    ts = event.get("ts")
+    if ts is None or isinstance(ts, bool):
+        return None
+    try:
+        if isinstance(ts, (int, float)):
+            value = float(ts)
+        else:
+            try:
+                value = float(ts)
+            except ValueError:
+                return datetime.fromisoformat(str(ts).replace("Z", "+00:00")).timestamp()
+        # Sub-second epochs: seconds are ~1e9 today, ms ~1e12, µs ~1e15, ns ~1e18
+        if value > 1e17:
+            return value / 1e9
+        if value > 1e14:
+            return value / 1e6
+        if value > 1e11:
+            return value / 1e3
+        return value
+    except (ValueError, TypeError, OverflowError):
+        return None
+
 class Trace:
     def __init__(self, trace_id: str):
         self.trace_id = trace_id
         self.events: List[dict] = []
-        self.last_updated: float = time.time()
+        self.created_at: float = time.time()
+        self.last_updated: float = self.created_at
+        self.last_event_time: Optional[float] = None
         self.is_finalized: bool = False
+        # Sort keys parallel to self.events: (event time or +inf, event_id)
+        self._order: List[Tuple[float, str]] = []
+        # Events carried over from an early-closed fragment (already learned)
+        self.resumed_from: int = 0
+
+    def resume(self, prior: "Trace"):
+        """Continue an early-closed fragment: carry its events over in order."""
+        self.events = list(prior.events)
+        self._order = list(prior._order)
+        self.last_event_time = prior.last_event_time
+        self.resumed_from = len(prior.events)
 
-    def add(self, event: dict):
-        self.events.append(event)
+    def learnable_events(self) -> List[dict]:
+        """
+        Events the model has not learned yet. For a resumed trace this starts at
+        the terminal event that closed the fragment, so the terminal -> next
+        transition is learned and the terminal state gets a non-ending visit.
+        """
+        if not self.resumed_from:
+            return self.events
+        return self.events[self.resumed_from - 1:]
+
+    def add(self, event: dict, ts: Optional[float] = None):
+        """
+        Insert an event in causal order.
+        `ts` is the event time in epoch seconds as resolved by the assembler;
+        events without one sort after all timestamped events, in arrival order.
+        """
         self.last_updated = time.time()
-        # Sort by timestamp to ensure causal ordering within trace
-        # We assume 'ts' is ISO string or timestamp number. 
-        # For simplicity in v1, we append and sort on finalize if needed, 
-        # or rely on upstream partially ordered stream.
-        # Strict sort:
-        self.events.sort(key=lambda x: (x.get("ts", ""), x.get("event_id", "")))
+        if ts is not None and (self.last_event_time is None or ts > self.last_event_time):
+            self.last_event_time = ts
+        key = (ts if ts is not None else math.inf, str(event.get("event_id") or ""))
+        idx = bisect.bisect_right(self._order, key)
+        self._order.insert(idx, key)
+        self.events.insert(idx, event)
 
     def duration(self) -> float:
-        if len(self.events) < 2:
-            return 0.0
-        try:
-            # Events are already sorted in self.add()
-            start_str = self.events[0].get("ts")
-            end_str = self.events[-1].get("ts")
-            
-            if not start_str or not end_str: return 0.0
-            
-            # Simple ISO parse
-            start = datetime.fromisoformat(str(start_str).replace("Z", "+00:00"))
-            end = datetime.fromisoformat(str(end_str).replace("Z", "+00:00"))
-            return (end - start).total_seconds()
-        except (ValueError, TypeError):
+        """Event-time span between the first and last timestamped events."""
+        if len(self.events) < 2 or self.last_event_time is None:
             return 0.0
+        # Timestamped events sort first, so the earliest is at the front
+        return self.last_event_time - self._order[0][0]
 
 class TraceAssembler:
     """
     Groups raw audit events into correlated traces.
     Enforces memory bounds and time-based eviction.
+
+    Traces are closed in event time: the watermark trails the newest event 'ts'
+    by `watermark_delay`, and a trace is finalized once the watermark passes its
+    last event by `event_gap`. Events older than the watermark minus
+    `allowed_lateness` that do not belong to an open trace are dropped as late.
+    Once the ingestion source reports `idle_polls` consecutive polls with no new
+    events (see `note_poll`), the watermark advances with wall time so the tail
+    still flushes. Idleness is not inferred from wall time alone: a slow or
+    backed-off poller must not close traces whose next events are in flight. `trace_ttl` remains a wall-clock backstop for
+    traces without a usable 'ts'. Timestamps more than `max_clock_skew` ahead of
+    wall time are treated as missing so a bad clock cannot drag the watermark
+    forward. An optional `terminal_detector` finalizes a trace as soon as it
+    reaches a learned end state; the closed trace is remembered for `event_gap`
+    so that later events resume it instead of starting an unrelated fragment.
     """
-    def __init__(self, max_traces: int = 10000, trace_ttl: int = 60):
+    def __init__(
+        self,
+        max_traces: int = 10000,
+        trace_ttl: int = 60,
+        max_finalized: int = 50000,
+        event_gap: float = 10.0,
+        watermark_delay: float = 2.0,
+        allowed_lateness: float = 30.0,
+        idle_polls: int = 2,
+        max_clock_skew: float = 300.0,
+        terminal_detector: Optional[Callable[[Trace], bool]] = None,
+    ):
         self.traces: Dict[str, Trace] = {}
         self.max_traces = max_traces
         self.trace_ttl = trace_ttl
+        self.event_gap = event_gap
+        self.watermark_delay = watermark_delay
+        self.allowed_lateness = allowed_lateness
+        self.idle_polls = idle_polls
+        self.max_clock_skew = max_clock_skew
+        self.terminal_detector = terminal_detector
+
+        # Event-time state
+        self.max_event_time: Optional[float] = None
+        self._empty_polls = 0
+        self._idle_since: Optional[float] = None # Wall time of the first empty poll in a run
+        self._deadlines: List[Tuple[float, str]] = [] # (close-at event time, trace_id) min-heap
+        self._untimed: Set[str] = set() # Traces only the wall-clock TTL can close
+        self._early_closed: Dict[str, Trace] = {} # Terminal closes that may still resume
+
+        self.late_events = 0
+        self.future_events = 0
+        self.early_finalized = 0
+        self.resumed_traces = 0
+        # Bounded hand-off to the scoring loop; oldest entries are shed when full
+        self.max_finalized = max_finalized
         self.finalized_queue: Deque[Trace] = deque()
+        self.dropped_finalized = 0
 
     def process_event(self, event: dict):
         """
@@ -71,15 +162,118 @@ class TraceAssembler:
             # Dropping un-correlated events for AIOps prevents noise.
             return
 
+        ts = event_time(event)
+        if ts is not None and ts > time.time() + self.max_clock_skew:
+            # Keep the event but not its timestamp: it must not move event time
+            self.future_events += 1
+            ts = None
+
+        # Lateness is judged against pure event time, ignoring idle advancement
+        open_or_resumable = trace_id in self.traces or trace_id in self._early_closed
+        if ts is not None and self.max_event_time is not None and not open_or_resumable:
+            if ts < self.max_event_time - self.watermark_delay - self.allowed_lateness:
+                self.late_events += 1
+                return
+
         # 2. Assign to Trace
         if trace_id not in self.traces:
             # Eviction check
             if len(self.traces) >= self.max_traces:
                 self._evict_oldest()
-            self.traces[trace_id] = Trace(trace_id)
+            trace = Trace(trace_id)
+            prior = self._early_closed.pop(trace_id, None)
+            if prior is not None:
+                trace.resume(prior)
+                self.resumed_traces += 1
+            self.traces[trace_id] = trace
             
         trace = self.traces[trace_id]
-        trace.add(event)
+        trace.add(event, ts)
+        self._empty_polls = 0
+        self._idle_since = None
+        if trace.last_event_time is None:
+            self._untimed.add(trace_id)
+        else:
+            self._untimed.discard(trace_id)
+
+        # 3. Every timestamped event moves event time, including terminal ones
+        advanced = ts is not None and (self.max_event_time is None or ts > self.max_event_time)
+        if advanced:
+            self.max_event_time = ts
+
+        # 4. Early close on a learned terminal state, else schedule the event-time close
+        if self.terminal_detector is not None and self.terminal_detector(trace):
+            self.early_finalized += 1
+            self._finalize(trace_id)
+            self._remember_early_close(trace)
+        elif trace.last_event_time is not None:
+            heapq.heappush(self._deadlines, (trace.last_event_time + self.event_gap, trace_id))
+
+        if advanced:
+            self.advance_watermark()
+
+    def _remember_early_close(self, trace: Trace):
+        """Keep a terminal close resumable until the watermark passes it by event_gap."""
+        # Untimed traces have no event-time horizon to expire on
+        if trace.last_event_time is None:
+            return
+        if len(self._early_closed) >= self.max_traces:
+            self._early_closed.pop(next(iter(self._early_closed)))
+        self._early_closed[trace.trace_id] = trace
+        heapq.heappush(self._deadlines, (trace.last_event_time + self.event_gap, trace.trace_id))
+
+    def note_poll(self, new_events: int, now: Optional[float] = None):
+        """Record a completed ingestion poll; consecutive empty polls mark the source idle."""
+        if new_events > 0:
+            self._empty_polls = 0
+            self._idle_since = None
+            return
+        self._empty_polls += 1
+        if self._idle_since is None:
+            self._idle_since = time.time() if now is None else now
+
+    def watermark(self, now: Optional[float] = None) -> Optional[float]:
+        """Current event-time watermark, or None before any timestamped event."""
+        if self.max_event_time is None:
+            return None
+        watermark = self.max_event_time - self.watermark_delay
+        if self._idle_since is not None and self._empty_polls >= self.idle_polls:
+            # Idle source: let event time follow wall time so the tail flushes
+            now = time.time() if now is None else now
+            watermark += max(0.0, now - self._idle_since)
+        return watermark
+
+    def advance_watermark(self, now: Optional[float] = None) -> int:
+        """Finalize every trace whose event-time deadline the watermark has passed."""
+        watermark = self.watermark(now)
+        if watermark is None:
+            return 0
+        closed = 0
+        while self._deadlines and self._deadlines[0][0] <= watermark:
+            deadline, trace_id = heapq.heappop(self._deadlines)
+            closed_early = self._early_closed.get(trace_id)
+            if closed_early is not None and closed_early.last_event_time + self.event_gap <= deadline:
+                del self._early_closed[trace_id]
+            trace = self.traces.get(trace_id)
+            # Skip stale entries: trace already closed or extended by a newer event
+            if trace is None or trace.last_event_time is None:
+                continue
+            if trace.last_event_time + self.event_gap > deadline:
+                continue
+            self._finalize(trace_id)
+            closed += 1
+
+        # Stale entries accumulate for long traces; compact occasionally
+        if len(self._deadlines) > 4 * max(len(self.traces), 1024):
+            self._deadlines = [
+                (t.last_event_time + self.event_gap, tid)
+                for tid, t in self.traces.items() if t.last_event_time is not None
+            ] + [
+                (t.last_event_time + self.event_gap, tid)
+                for tid, t in self._early_closed.items()
+            ]
+            heapq.heapify(self._deadlines)
+        return closed
 
     def _evict_oldest(self):
         """Force expire the oldest trace (by update time) to free memory."""
@@ -97,15 +291,23 @@ class TraceAssembler:
         """Move trace to finalized queue and remove from sorting buffer."""
         if trace_id in self.traces:
             trace = self.traces.pop(trace_id)
+            self._untimed.discard(trace_id)
             trace.is_finalized = True
+            if len(self.finalized_queue) >= self.max_finalized:
+                self.finalized_queue.popleft()
+                self.dropped_finalized += 1
+                if self.dropped_finalized % 1000 == 1:
+                    logger.warning(f"Finalized queue full ({self.max_finalized}), {self.dropped_finalized} traces dropped so far")
             self.finalized_queue.append(trace)
 
     def maintenance(self):
         """Call periodically to expire idle traces."""
         now = time.time()
+        self.advance_watermark(now)
+        # Timestamped traces close on the watermark; only untimed ones need the TTL scan
         to_finalize = []
-        for tid, trace in self.traces.items():
-            if now - trace.last_updated > self.trace_ttl:
+        for tid in self._untimed:
+            if now - self.traces[tid].last_updated > self.trace_ttl:
                 to_finalize.append(tid)
         
         for tid in to_finalize:
@@ -116,3 +318,9 @@ class TraceAssembler:
         batch = list(self.finalized_queue)
         self.finalized_queue.clear()
         return batch
+
+    def pop_finalized(self) -> Optional[Trace]:
+        """Retrieve the oldest finalized trace, or None if the queue is empty."""
+        if not self.finalized_queue:
+            return None
+        return self.finalized_queue.popleft()
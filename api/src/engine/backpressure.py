@@ -0,0 +1,108 @@
+from typing import Callable, Dict, Hashable, Optional
+import time
+import logging
+
+from src.engine.assembler import TraceAssembler, Trace
+
+logger = logging.getLogger("aiops-backpressure")
+
+def default_stratum(trace: Trace) -> Hashable:
+    """Stratify by entry action and final outcome so rare failure shapes keep being learned."""
+    if not trace.events:
+        return ("", "")
+    first, last = trace.events[0], trace.events[-1]
+    return (str(first.get("action") or first.get("method") or ""), str(last.get("outcome", "OK")))
+
+class BackpressureController:
+    """
+    Bounds the work the scoring loop does per tick and degrades learning under load.
+    - Draining is time-sliced: at most `tick_budget` seconds of processing per call.
+    - Overload is entered above `high_watermark` and left below `low_watermark` (hysteresis).
+    - While overloaded every trace is still scored, but only a stratified sample is learned.
+    - The ingestion poller backs off proportionally to queue depth.
+    """
+    def __init__(
+        self,
+        high_watermark: int = 5000,
+        low_watermark: int = 1000,
+        min_sample_rate: float = 0.05,
+        tick_budget: float = 0.05,
+        base_poll_interval: float = 5.0,
+        max_poll_interval: float = 30.0,
+        stratum_key: Callable[[Trace], Hashable] = default_stratum,
+    ):
+        if low_watermark > high_watermark:
+            raise ValueError("low_watermark must not exceed high_watermark")
+        if tick_budget <= 0:
+            raise ValueError("tick_budget must be positive")
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.min_sample_rate = min_sample_rate
+        self.tick_budget = tick_budget
+        self.base_poll_interval = base_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.stratum_key = stratum_key
+
+        self.overloaded = False
+        self.sample_rate = 1.0
+        self.depth = 0
+        self.learn_skipped = 0
+        self._stratum_seen: Dict[Hashable, int] = {}
+        self._max_strata = 10000
+
+    def update(self, depth: int):
+        """Re-evaluate overload state and learning sample rate for the current queue depth."""
+        self.depth = depth
+        if not self.overloaded and depth >= self.high_watermark:
+            self.overloaded = True
+            logger.warning(f"Entering overload mode (queue depth {depth})")
+        elif self.overloaded and depth <= self.low_watermark:
+            self.overloaded = False
+            self._stratum_seen.clear()
+            logger.info(f"Leaving overload mode (queue depth {depth})")
+
+        if self.overloaded:
+            # Learn roughly low_watermark traces' worth of the backlog
+            self.sample_rate = max(self.min_sample_rate, min(1.0, self.low_watermark / max(depth, 1)))
+        else:
+            self.sample_rate = 1.0
+
+    def should_learn(self, trace: Trace) -> bool:
+        """Stratified sampling: within each stratum learn every Nth trace (always the first)."""
+        if not self.overloaded or self.sample_rate >= 1.0:
+            return True
+
+        key = self.stratum_key(trace)
+        seen = self._stratum_seen.get(key, 0)
+        if seen == 0 and len(self._stratum_seen) >= self._max_strata:
+            self._stratum_seen.clear()
+        self._stratum_seen[key] = seen + 1
+
+        stride = max(1, round(1.0 / self.sample_rate))
+        if seen % stride == 0:
+            return True
+        self.learn_skipped += 1
+        return False
+
+    def drain(self, assembler: TraceAssembler, handler: Callable[[Trace], None]) -> int:
+        """Process finalized traces until the queue is empty or the tick budget is spent."""
+        deadline = time.perf_counter() + self.tick_budget
+        processed = 0
+        while time.perf_counter() < deadline:
+            trace = assembler.pop_finalized()
+            if trace is None:
+                break
+            handler(trace)
+            processed += 1
+        self.update(len(assembler.finalized_queue))
+        return processed
+
+    def poll_interval(self, depth: Optional[int] = None) -> float:
+        """Ingestion poll interval; stretches linearly with depth above the low watermark."""
+        if depth is None:
+            depth = self.depth
+        if depth <= self.low_watermark:
+            return self.base_poll_interval
+        span = max(self.high_watermark - self.low_watermark, 1)
+        factor = 1.0 + (depth - self.low_watermark) / span
+        return min(self.max_poll_interval, self.base_poll_interval * factor)
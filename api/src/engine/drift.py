@@ -0,0 +1,253 @@
+from typing import Dict, List, Optional, Set, Tuple
+import math
+import time
+import logging
+
+from src.engine.markov import TransitionMatrixEngine, State
+
+logger = logging.getLogger("aiops-drift")
+
+def _xlogx(x: float) -> float:
+    return x * math.log(x) if x > 0 else 0.0
+
+class DriftDetector:
+    """
+    Tracks divergence of the live transition distribution from a baseline snapshot.
+
+    Per source state s with live counts c_d (N = sum c_d) and smoothed baseline p_d:
+        KL(Q_s || P_s) = (sum c_d log c_d - N log N - sum c_d log p_d) / N
+    The two sums are maintained per state, so every edge delta from the engine
+    costs O(1). Jensen-Shannon (base 2, bounded in [0, 1]) has no such additive
+    form; it is recomputed lazily, only for states touched since the last read,
+    and the global figure keeps a running sum of N_s * JS_s over clean states.
+    Running sums are rebuilt every `resync_interval` deltas to bound float error.
+    Until the first baseline is taken there is nothing to diverge from, so every
+    divergence accessor returns None.
+    """
+    def __init__(
+        self,
+        alpha: float = 0.5,
+        rotation_interval: Optional[float] = None,
+        rotation_max_drift: float = 0.1,
+        resync_interval: int = 100000,
+    ):
+        self.alpha = alpha
+        self.rotation_interval = rotation_interval
+        self.rotation_max_drift = rotation_max_drift
+        self.resync_interval = resync_interval
+        self._deltas_since_resync = 0
+
+        # Baseline distribution (frozen between rotations)
+        self.baseline: Dict[State, Dict[State, int]] = {}
+        self.baseline_out: Dict[State, int] = {}
+        self.baseline_at: Optional[float] = None
+        self._support = 1
+
+        # Live window mirror, kept in sync through engine edge deltas
+        self.live: Dict[State, Dict[State, int]] = {}
+        self.live_out: Dict[State, int] = {}
+        self.live_total = 0
+
+        # Incremental KL accumulators
+        self._sum_clogc: Dict[State, float] = {}
+        self._sum_clogp: Dict[State, float] = {}
+        self._global_kl_mass = 0.0 # sum_s N_s * KL_s
+
+        # Lazy JS: cached per clean state, with its N_s * JS_s share of the global mass
+        self._js_cache: Dict[State, float] = {}
+        self._js_contrib: Dict[State, float] = {}
+        self._global_js_mass = 0.0 # sum over clean states of N_s * JS_s
+        self._dirty: Set[State] = set()
+
+    @property
+    def has_baseline(self) -> bool:
+        return self.baseline_at is not None
+
+    def attach(self, engine: TransitionMatrixEngine):
+        """Mirror the engine's current counts and subscribe to its edge deltas."""
+        for (src, dst), count in engine.edge_counts.items():
+            if count > 0:
+                self.on_edge_delta(src, dst, count)
+        engine.edge_listeners.append(self.on_edge_delta)
+
+    def _log_p(self, src: State, dst: State) -> float:
+        # Support size is frozen at rotation so log p_d stays constant between rotations
+        count = self.baseline.get(src, {}).get(dst, 0)
+        total = self.baseline_out.get(src, 0)
+        return math.log((count + self.alpha) / (total + self.alpha * self._support))
+
+    def _kl_mass(self, src: State) -> float:
+        n = self.live_out.get(src, 0)
+        if n <= 0:
+            return 0.0
+        return self._sum_clogc.get(src, 0.0) - _xlogx(n) - self._sum_clogp.get(src, 0.0)
+
+    def on_edge_delta(self, src: State, dst: State, delta: int):
+        """Apply a single edge count change. O(1)."""
+        row = self.live.get(src, {})
+        old = row.get(dst, 0)
+        new = max(0, old + delta)
+        if new == old:
+            return
+        self.live[src] = row
+
+        self._invalidate_js(src)
+        before = self._kl_mass(src)
+        self._sum_clogc[src] = self._sum_clogc.get(src, 0.0) + _xlogx(new) - _xlogx(old)
+        self._sum_clogp[src] = self._sum_clogp.get(src, 0.0) + (new - old) * self._log_p(src, dst)
+        self.live_out[src] = self.live_out.get(src, 0) + (new - old)
+        self.live_total += new - old
+
+        if new:
+            row[dst] = new
+        else:
+            row.pop(dst, None)
+        if not row:
+            # State left the window; drop accumulators to avoid float residue
+            self.live.pop(src, None)
+            self.live_out.pop(src, None)
+            self._sum_clogc.pop(src, None)
+            self._sum_clogp.pop(src, None)
+            self._dirty.discard(src)
+
+        self._global_kl_mass += self._kl_mass(src) - before
+
+        self._deltas_since_resync += 1
+        if self._deltas_since_resync >= self.resync_interval:
+            self.resync()
+
+    def _invalidate_js(self, state: State):
+        """Withdraw a state's JS contribution; it is recomputed on the next read."""
+        contrib = self._js_contrib.pop(state, None)
+        if contrib is not None:
+            self._global_js_mass -= contrib
+        self._js_cache.pop(state, None)
+        self._dirty.add(state)
+
+    def resync(self):
+        """Rebuild all running sums from the live mirror. O(edges)."""
+        self._sum_clogc = {
+            src: sum(_xlogx(c) for c in row.values()) for src, row in self.live.items()
+        }
+        self._sum_clogp = {
+            src: sum(c * self._log_p(src, dst) for dst, c in row.items())
+            for src, row in self.live.items()
+        }
+        self._global_kl_mass = sum(self._kl_mass(src) for src in self.live)
+        self._global_js_mass = sum(self._js_contrib.values())
+        self._deltas_since_resync = 0
+
+    def rotate_baseline(self, now: Optional[float] = None):
+        """Adopt the live window as the new baseline. O(edges); runs rarely."""
+        self.baseline = {src: dict(row) for src, row in self.live.items()}
+        self.baseline_out = dict(self.live_out)
+        states = set(self.baseline)
+        for row in self.baseline.values():
+            states.update(row)
+        self._support = len(states) + 1 # +1 reserves mass for unseen destinations
+        self.baseline_at = time.time() if now is None else now
+
+        self._js_cache.clear()
+        self._js_contrib.clear()
+        self._dirty = set(self.live)
+        self.resync()
+        logger.info(f"Drift baseline rotated ({len(self.baseline)} states)")
+
+    def maybe_rotate(self, now: Optional[float] = None) -> bool:
+        """Rotate on the configured interval, unless drift is high enough to look like an incident."""
+        if self.rotation_interval is None or self.baseline_at is None:
+            return False
+        now = time.time() if now is None else now
+        if now - self.baseline_at < self.rotation_interval:
+            return False
+        if (self.global_kl() or 0.0) > self.rotation_max_drift:
+            return False
+        self.rotate_baseline(now)
+        return True
+
+    def state_kl(self, state: State) -> Optional[float]:
+        n = self.live_out.get(state, 0)
+        if n <= 0 or not self.has_baseline:
+            return None
+        # Smoothing leaves the baseline slightly unnormalized; clamp tiny negatives
+        return max(0.0, self._kl_mass(state) / n)
+
+    def global_kl(self) -> Optional[float]:
+        if not self.has_baseline:
+            return None
+        if self.live_total <= 0:
+            return 0.0
+        return max(0.0, self._global_kl_mass / self.live_total)
+
+    def _compute_js(self, state: State) -> float:
+        row = self.live[state]
+        n = self.live_out[state]
+        base = self.baseline.get(state)
+        base_n = self.baseline_out.get(state, 0)
+        if not base or base_n <= 0:
+            return 1.0 # State unseen in baseline: maximally divergent
+
+        js = 0.0
+        for dst in row.keys() | base.keys():
+            q = row.get(dst, 0) / n
+            p = base.get(dst, 0) / base_n
+            m = (p + q) / 2
+            if q > 0:
+                js += 0.5 * q * math.log2(q / m)
+            if p > 0:
+                js += 0.5 * p * math.log2(p / m)
+        return min(1.0, max(0.0, js))
+
+    def state_js(self, state: State) -> Optional[float]:
+        if state not in self.live or not self.has_baseline:
+            return None
+        if state in self._dirty or state not in self._js_cache:
+            js = self._compute_js(state)
+            contrib = js * self.live_out[state]
+            self._global_js_mass += contrib - self._js_contrib.get(state, 0.0)
+            self._js_cache[state] = js
+            self._js_contrib[state] = contrib
+            self._dirty.discard(state)
+        return self._js_cache[state]
+
+    def refresh(self):
+        """Recompute JS for every state touched since the last refresh."""
+        if not self.has_baseline:
+            return
+        for state in list(self._dirty):
+            self.state_js(state)
+
+    def global_js(self) -> Optional[float]:
+        """Live-traffic weighted mean of per-state JS. O(dirty states)."""
+        if not self.has_baseline:
+            return None
+        if self.live_total <= 0:
+            return 0.0
+        self.refresh()
+        return min(1.0, max(0.0, self._global_js_mass / self.live_total))
+
+    def report(self, top_n: int = 20) -> Tuple[dict, Dict[State, dict]]:
+        """
+        Global summary plus per-state drift, for publishing in the model snapshot.
+        O(live states); call once per scoring cycle and reuse the result.
+        """
+        self.refresh()
+        per_state: Dict[State, dict] = {}
+        for state, n in self.live_out.items():
+            per_state[state] = {
+                "kl": self.state_kl(state),
+                "js": self.state_js(state),
+                "live_out": n,
+                "baseline_out": self.baseline_out.get(state, 0),
+            }
+        ranked: List[State] = []
+        if self.has_baseline:
+            ranked = sorted(per_state, key=lambda s: (-per_state[s]["js"], s))[:top_n]
+        summary = {
+            "has_baseline": self.has_baseline,
+            "baseline_at": self.baseline_at,
+            "kl": self.global_kl(),
+            "js": self.global_js(),
+            "top_states": [{"state": s, **per_state[s]} for s in ranked],
+        }
+        return summary, per_state
@@ -1,4 +1,4 @@
-from typing import Dict, Tuple, Deque, List
+from typing import Callable, Dict, Tuple, Deque, List, Optional
 from collections import defaultdict, deque
 import logging
 import math
@@ -6,6 +6,7 @@ import math
 logger = logging.getLogger("aiops-markov")
 
 State = str # "Actor:Action:Outcome"
+EdgeListener = Callable[[State, State, int], None] # (src, dst, delta)
 
 class TransitionMatrixEngine:
     """
@@ -20,43 +21,59 @@ class TransitionMatrixEngine:
         self.out_counts: Dict[State, int] = defaultdict(int)
         self.states: set[State] = set()
         
+        # End-of-trace statistics: how often a visit to a state was the last one
+        self.visit_counts: Dict[State, int] = defaultdict(int)
+        self.end_counts: Dict[State, int] = defaultdict(int)
+        
         # Sliding Window Management
         # We store minimal trace info to support expiration (decrementing counts)
         self.window_traces: Deque[List[State]] = deque()
         self.total_traces = 0
+        
+        # Observers notified of every edge count change (e.g. drift detection)
+        self.edge_listeners: List[EdgeListener] = []
+
+    def _notify(self, src: State, dst: State, delta: int):
+        for listener in self.edge_listeners:
+            listener(src, dst, delta)
+
+    def _event_state(self, event: dict) -> Optional[State]:
+        """Map a raw event to its state, or None if it cannot be interpreted."""
+        try:
+            # State Definition: ActorType:Action:Outcome
+            actor = "unknown"
+            principal = event.get("principal") or event.get("agent_id")
+            if isinstance(principal, dict):
+                actor = principal.get("type", "unknown")
+            elif isinstance(principal, str):
+                actor = "service" if principal in ["gateway", "audit-service"] else "user"
+            
+            # Action Normalization
+            action = event.get("action")
+            if not action or isinstance(action, dict):
+                action = event.get("method")
+            if not action or isinstance(action, dict):
+                action = event.get("http", {}).get("path", "unknown")
+            
+            action_str = str(action)
+            if "/api/events" in action_str: action_str = "emit_audit"
+            if "/mcp/tools" in action_str: action_str = "tool_use"
+            # Strip IDs? Assumed handled by 'method' usually being clean 
+            # but raw paths might leak IDs.
+            
+            outcome = event.get("outcome", "OK")
+            
+            return f"{actor}:{action_str}:{outcome}"
+        except Exception:
+            return None
 
     def _extract_sequence(self, trace_events: List[dict]) -> List[State]:
         """Convert raw events to state sequence."""
         seq = []
         for event in trace_events:
-            try:
-                # State Definition: ActorType:Action:Outcome
-                actor = "unknown"
-                principal = event.get("principal") or event.get("agent_id")
-                if isinstance(principal, dict):
-                    actor = principal.get("type", "unknown")
-                elif isinstance(principal, str):
-                    actor = "service" if principal in ["gateway", "audit-service"] else "user"
-                
-                # Action Normalization
-                action = event.get("action")
-                if not action or isinstance(action, dict):
-                    action = event.get("method")
-                if not action or isinstance(action, dict):
-                    action = event.get("http", {}).get("path", "unknown")
-                
-                action_str = str(action)
-                if "/api/events" in action_str: action_str = "emit_audit"
-                if "/mcp/tools" in action_str: action_str = "tool_use"
-                # Strip IDs? Assumed handled by 'method' usually being clean 
-                # but raw paths might leak IDs.
-                
-                outcome = event.get("outcome", "OK")
-                
-                state = f"{actor}:{action_str}:{outcome}"
+            state = self._event_state(event)
+            if state is not None:
                 seq.append(state)
-            except Exception:
-                continue
         return seq
 
     def add_trace(self, trace_events: List[dict]):
@@ -68,6 +85,10 @@ class TransitionMatrixEngine:
         self.window_traces.append(seq)
         self.total_traces += 1
         
+        for state in seq:
+            self.visit_counts[state] += 1
+        self.end_counts[seq[-1]] += 1
+        
         # Update Counts
         for i in range(len(seq) - 1):
             src, dst = seq[i], seq[i+1]
@@ -75,6 +96,7 @@ class TransitionMatrixEngine:
             self.out_counts[src] += 1
             self.states.add(src)
             self.states.add(dst)
+            self._notify(src, dst, 1)
 
     def expire_oldest(self):
         """Remove the oldest trace from the window (sliding logic)."""
@@ -84,11 +106,18 @@ class TransitionMatrixEngine:
         seq = self.window_traces.popleft()
         self.total_traces -= 1
         
+        for state in seq:
+            if self.visit_counts[state] > 0:
+                self.visit_counts[state] -= 1
+        if self.end_counts[seq[-1]] > 0:
+            self.end_counts[seq[-1]] -= 1
+        
         # Decrement Counts
         for i in range(len(seq) - 1):
             src, dst = seq[i], seq[i+1]
             if self.edge_counts[(src, dst)] > 0:
                 self.edge_counts[(src, dst)] -= 1
+                self._notify(src, dst, -1)
             if self.out_counts[src] > 0:
                 self.out_counts[src] -= 1
             
@@ -109,6 +138,25 @@ class TransitionMatrixEngine:
         prob = (count + self.alpha) / (total_out + self.alpha * num_states)
         return prob
 
+    def end_probability(self, state: State) -> float:
+        """Learned probability that a trace ends after visiting `state` (shrunk toward 0)."""
+        visits = self.visit_counts.get(state, 0)
+        if visits == 0:
+            return 0.0
+        return self.end_counts.get(state, 0) / (visits + self.alpha)
+
+    def is_end_of_trace(self, trace_events: List[dict], threshold: float = 0.95, min_support: int = 20) -> bool:
+        """
+        Whether the latest event puts the trace in a learned terminal state.
+        Requires `min_support` observed visits so a cold model never finalizes early.
+        """
+        if not trace_events:
+            return False
+        state = self._event_state(trace_events[-1])
+        if state is None or self.visit_counts.get(state, 0) < min_support:
+            return False
+        return self.end_probability(state) >= threshold
+
     def score_trace(self, trace_events: List[dict]) -> float:
         """
         Calculate Sequence Likelihood Score.
@@ -0,0 +1,184 @@
+from typing import Dict, List, Mapping, Optional, Tuple
+from dataclasses import dataclass, field, asdict
+from types import MappingProxyType
+import hashlib
+import json
+import time
+import logging
+
+from src.engine.markov import TransitionMatrixEngine, State
+
+logger = logging.getLogger("aiops-snapshot")
+
+@dataclass(frozen=True)
+class TransitionStat:
+    src: State
+    dst: State
+    count: int
+    share: float        # Empirical count / out_count of src
+    probability: float  # Smoothed probability as used for scoring
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+@dataclass(frozen=True)
+class ModelSnapshot:
+    """
+    Immutable, versioned read model of the engine.
+    Built once per scoring cycle so API handlers never touch the live counters.
+    Every API response body is serialized here once; handlers only look bytes up.
+    """
+    version: int
+    generated_at: float
+    etag: str
+    integrity_body: bytes
+    top_transitions: Tuple[TransitionStat, ...]
+    outgoing: Mapping[State, Tuple[TransitionStat, ...]]
+    out_counts: Mapping[State, int]
+    rare_edges: Tuple[TransitionStat, ...]
+    drift_summary: Mapping[str, object] = field(default_factory=lambda: MappingProxyType({}))
+    state_drift: Mapping[State, Mapping[str, object]] = field(default_factory=lambda: MappingProxyType({}))
+    top_body: bytes = b""
+    states_body: bytes = b""
+    rare_body: bytes = b""
+    drift_body: bytes = b""
+    transitions_bodies: Mapping[State, bytes] = field(default_factory=lambda: MappingProxyType({}))
+    drift_bodies: Mapping[State, bytes] = field(default_factory=lambda: MappingProxyType({}))
+    content_digest: str = field(repr=False, default="")
+
+    def transitions_for(self, state: State) -> Optional[Tuple[TransitionStat, ...]]:
+        """O(1) lookup of the precomputed outgoing distribution of a state."""
+        return self.outgoing.get(state)
+
+def _index_transitions(
+    engine: TransitionMatrixEngine, rare_share: float
+) -> Tuple[Dict[State, Tuple[TransitionStat, ...]], List[TransitionStat], List[TransitionStat]]:
+    by_src: Dict[State, List[TransitionStat]] = {}
+    all_edges: List[TransitionStat] = []
+    rare: List[TransitionStat] = []
+
+    for (src, dst), count in engine.edge_counts.items():
+        # Expired edges stay in the sparse map with a zero count
+        if count <= 0:
+            continue
+        total_out = engine.out_counts.get(src, 0)
+        stat = TransitionStat(
+            src=src,
+            dst=dst,
+            count=count,
+            share=count / total_out if total_out else 0.0,
+            probability=engine.get_probability(src, dst),
+        )
+        by_src.setdefault(src, []).append(stat)
+        all_edges.append(stat)
+        if stat.share < rare_share:
+            rare.append(stat)
+
+    outgoing = {
+        src: tuple(sorted(stats, key=lambda s: (-s.count, s.dst)))
+        for src, stats in by_src.items()
+    }
+    return outgoing, all_edges, rare
+
+def _json_body(payload) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+def build_snapshot(
+    engine: TransitionMatrixEngine,
+    version: int,
+    integrity: dict,
+    top_n: int = 20,
+    rare_share: float = 0.05,
+    drift: Optional[Tuple[dict, Dict[State, dict]]] = None,
+) -> ModelSnapshot:
+    """
+    Materialize a snapshot from the engine's current counts.
+    `integrity` is the `/metrics/integrity` payload computed by the scoring loop;
+    it is serialized here once and served verbatim until the next snapshot.
+    `drift` is the (summary, per_state) pair from `DriftDetector.report()`.
+    """
+    drift_summary, state_drift = drift if drift is not None else ({}, {})
+    outgoing, all_edges, rare = _index_transitions(engine, rare_share)
+    top = sorted(all_edges, key=lambda s: (-s.count, s.src, s.dst))[:top_n]
+    rare.sort(key=lambda s: (s.share, s.src, s.dst))
+    out_counts = {src: engine.out_counts[src] for src in outgoing}
+
+    body = json.dumps(integrity, sort_keys=True, separators=(",", ":")).encode()
+    digest = hashlib.sha1(body).hexdigest()
+
+    transitions_bodies = {
+        src: _json_body({
+            "version": version,
+            "state": src,
+            "out_count": out_counts[src],
+            "transitions": [t.to_dict() for t in stats],
+        })
+        for src, stats in outgoing.items()
+    }
+    drift_bodies = {
+        src: _json_body({"version": version, "state": src, **d})
+        for src, d in state_drift.items()
+    }
+
+    return ModelSnapshot(
+        version=version,
+        generated_at=time.time(),
+        etag=f'"{version}-{digest[:16]}"',
+        integrity_body=body,
+        top_transitions=tuple(top),
+        outgoing=MappingProxyType(outgoing),
+        out_counts=MappingProxyType(out_counts),
+        rare_edges=tuple(rare),
+        drift_summary=MappingProxyType(dict(drift_summary)),
+        state_drift=MappingProxyType({s: MappingProxyType(dict(d)) for s, d in state_drift.items()}),
+        top_body=_json_body({"version": version, "transitions": [t.to_dict() for t in top]}),
+        states_body=_json_body({"version": version, "states": out_counts}),
+        rare_body=_json_body({
+            "version": version,
+            "rare_share": rare_share,
+            "edges": [t.to_dict() for t in rare],
+        }),
+        drift_body=_json_body({"version": version, **drift_summary}),
+        transitions_bodies=MappingProxyType(transitions_bodies),
+        drift_bodies=MappingProxyType(drift_bodies),
+        content_digest=digest,
+    )
+
+class SnapshotPublisher:
+    """
+    Holds the latest published snapshot.
+    The version only advances when the content actually changes, so idle
+    cycles keep the same ETag and clients keep getting 304s.
+    """
+    def __init__(self, top_n: int = 20, rare_share: float = 0.05):
+        self.top_n = top_n
+        self.rare_share = rare_share
+        self.version = 0
+        self.current: Optional[ModelSnapshot] = None
+
+    def publish(
+        self,
+        engine: TransitionMatrixEngine,
+        integrity: dict,
+        drift: Optional[Tuple[dict, Dict[State, dict]]] = None,
+    ) -> ModelSnapshot:
+        candidate = build_snapshot(
+            engine, self.version + 1, integrity, top_n=self.top_n, rare_share=self.rare_share, drift=drift
+        )
+        if self.current is not None and self._same_content(self.current, candidate):
+            return self.current
+
+        self.version = candidate.version
+        self.current = candidate
+        return candidate
+
+    @staticmethod
+    def _same_content(a: ModelSnapshot, b: ModelSnapshot) -> bool:
+        return (
+            a.content_digest == b.content_digest
+            and a.top_transitions == b.top_transitions
+            and a.rare_edges == b.rare_edges
+            and dict(a.outgoing) == dict(b.outgoing)
+            and dict(a.drift_summary) == dict(b.drift_summary)
+            and dict(a.state_drift) == dict(b.state_drift)
+        )
@@ -1,13 +1,18 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from contextlib import asynccontextmanager
 import os
+import time
 import asyncio
 import logging
-from prometheus_client import start_http_server, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from typing import Callable, Mapping
+from prometheus_client import start_http_server, Gauge, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from fastapi.responses import Response
 
 from src.engine.assembler import TraceAssembler
 from src.engine.markov import TransitionMatrixEngine
+from src.engine.backpressure import BackpressureController
+from src.engine.drift import DriftDetector
+from src.engine.snapshot import SnapshotPublisher, ModelSnapshot
 from src.worker.ingest import IngestionWorker
 
 # Logging
@@ -18,22 +23,81 @@ logger = logging.getLogger("aiops-main")
 AIOPS_INTEGRITY_SCORE = Gauge("aiops_integrity_score", "System integrity score based on anomaly rate")
 AIOPS_MODEL_READY = Gauge("aiops_model_ready", "Whether the anomaly model is trained and ready")
 AIOPS_TRACES_TRACKED = Gauge("aiops_traces_tracked", "Number of currently active traces")
+AIOPS_FINALIZED_QUEUE_DEPTH = Gauge("aiops_finalized_queue_depth", "Finalized traces awaiting scoring")
+AIOPS_OVERLOAD = Gauge("aiops_overload", "Whether the scoring pipeline is in overload mode")
+AIOPS_LEARN_SAMPLE_RATE = Gauge("aiops_learn_sample_rate", "Fraction of scored traces fed to the model")
+AIOPS_DRIFT_KL = Gauge("aiops_drift_kl", "Traffic-weighted KL divergence of live transitions from the baseline")
+AIOPS_DRIFT_JS = Gauge("aiops_drift_js", "Traffic-weighted Jensen-Shannon divergence of live transitions from the baseline")
+AIOPS_FINALIZED_DROPPED = Counter("aiops_finalized_dropped", "Finalized traces shed because the queue was full")
+AIOPS_EVENT_WATERMARK = Gauge("aiops_event_watermark", "Event-time watermark of the trace assembler (epoch seconds)")
+AIOPS_LATE_EVENTS = Counter("aiops_late_events", "Events dropped for arriving beyond the allowed lateness")
+AIOPS_FUTURE_EVENTS = Counter("aiops_future_events", "Events whose timestamp was ignored for being too far ahead of wall time")
+AIOPS_EARLY_FINALIZED = Counter("aiops_early_finalized", "Traces finalized early on a learned terminal state")
+AIOPS_RESUMED_TRACES = Counter("aiops_resumed_traces", "Early-closed traces resumed by events after their terminal state")
+AIOPS_TIME_TO_SCORE = Histogram(
+    "aiops_time_to_score_seconds",
+    "Wall time from a trace's first event to its scoring",
+    buckets=(0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300),
+)
 
 # State
-assembler = TraceAssembler(max_traces=10000)
 engine = TransitionMatrixEngine(alpha=0.5)
+assembler = TraceAssembler(
+    max_traces=10000,
+    max_finalized=50000,
+    event_gap=10.0,
+    watermark_delay=2.0,
+    allowed_lateness=30.0,
+    terminal_detector=lambda trace: engine.is_end_of_trace(trace.events),
+)
+backpressure = BackpressureController(high_watermark=5000, low_watermark=1000, tick_budget=0.05)
+# Baseline rotation is opt-in: seconds between rotations, unset disables it
+_rotation = os.getenv("AIOPS_DRIFT_ROTATION_SECONDS")
+drift = DriftDetector(alpha=engine.alpha, rotation_interval=float(_rotation) if _rotation else None)
+drift.attach(engine)
 worker = None
+publisher = SnapshotPublisher(top_n=20, rare_share=0.05)
 
 # Scoring History for Integrity Calculation
 SCORE_HISTORY = []
 MAX_HISTORY = 100
 
+# Scoring loop cadence: full cycle (maintenance, metrics, snapshot) vs backlog drain ticks
+SCORING_INTERVAL = 5.0
+BACKLOG_TICK = 0.05
+# Last totals exported for assembler counters (Prometheus counters only increment)
+_counter_totals = {}
+
+def _integrity_payload(current_integrity: float, drift_summary: dict) -> dict:
+    ready = engine.total_traces > 100
+    return {
+        "model_ready": ready,
+        "readiness_reason": "ok" if ready else f"insufficient_data ({engine.total_traces}/100 traces)",
+        "training_window_traces": engine.total_traces,
+        "integrity_score": current_integrity,
+        "recent_anomaly_scores_avg": sum(SCORE_HISTORY)/len(SCORE_HISTORY) if SCORE_HISTORY else 0.0,
+        "drift": {
+            "has_baseline": drift_summary["has_baseline"],
+            "kl": drift_summary["kl"],
+            "js": drift_summary["js"],
+        },
+        "stats": {
+            "states": len(engine.states),
+            "edges": len(engine.edge_counts),
+            "active_traces": len(assembler.traces)
+        }
+    }
+
+# Publish an empty snapshot so the read endpoints are valid before the first cycle
+_initial_drift = drift.report()
+publisher.publish(engine, _integrity_payload(1.0, _initial_drift[0]), drift=_initial_drift)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     audit_url = os.getenv("AUDIT_SERVICE_URL", "http://talos-audit-service:8001")
     global worker
-    worker = IngestionWorker(audit_url, assembler, cursor_path="/data/cursor.json")
+    worker = IngestionWorker(audit_url, assembler, cursor_path="/data/cursor.json", backpressure=backpressure)
     
     # Start Worker
     logger.info(f"Starting AIOps Ingestion Worker targeting {audit_url}")
@@ -57,72 +121,182 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(title="Talos AIOps", lifespan=lifespan)
 
+def _process_trace(trace):
+    """Score a finalized trace and, if sampled, learn it into the model window."""
+    # Score BEFORE learning (for anomaly detection); every trace is scored
+    score = engine.score_trace(trace.events)
+    AIOPS_TIME_TO_SCORE.observe(time.time() - trace.created_at)
+    SCORE_HISTORY.append(score)
+    if len(SCORE_HISTORY) > MAX_HISTORY:
+        SCORE_HISTORY.pop(0)
+    
+    # Under overload only a stratified sample is learned
+    if backpressure.should_learn(trace):
+        # Resumed traces skip the prefix their early-closed fragment already taught
+        engine.add_trace(trace.learnable_events())
+        
+        # Check for expiration
+        if engine.total_traces > 2000: # Window size hardcap v1
+            engine.expire_oldest()
+
+def _export_total(counter, total: int):
+    delta = total - _counter_totals.get(counter, 0)
+    if delta > 0:
+        counter.inc(delta)
+        _counter_totals[counter] = total
+
+def _update_backpressure_metrics():
+    AIOPS_FINALIZED_QUEUE_DEPTH.set(len(assembler.finalized_queue))
+    AIOPS_OVERLOAD.set(1 if backpressure.overloaded else 0)
+    AIOPS_LEARN_SAMPLE_RATE.set(backpressure.sample_rate)
+    _export_total(AIOPS_FINALIZED_DROPPED, assembler.dropped_finalized)
+
+def _update_assembler_metrics():
+    AIOPS_TRACES_TRACKED.set(len(assembler.traces))
+    watermark = assembler.watermark()
+    if watermark is not None:
+        AIOPS_EVENT_WATERMARK.set(watermark)
+    _export_total(AIOPS_LATE_EVENTS, assembler.late_events)
+    _export_total(AIOPS_FUTURE_EVENTS, assembler.future_events)
+    _export_total(AIOPS_EARLY_FINALIZED, assembler.early_finalized)
+    _export_total(AIOPS_RESUMED_TRACES, assembler.resumed_traces)
+
 async def background_scoring_loop():
     """Periodically finalize traces and update the model."""
+    last_cycle = 0.0
     while True:
+        failed = False
         try:
-            # 1. Maintenance (timeouts)
-            assembler.maintenance()
-            AIOPS_TRACES_TRACKED.set(len(assembler.traces))
+            now = time.monotonic()
+            cycle_due = now - last_cycle >= SCORING_INTERVAL
+            
+            # 1. Maintenance (watermark + wall-clock timeouts)
+            if cycle_due:
+                # Stamp up front so a failing cycle is not retried on every drain tick
+                last_cycle = now
+                assembler.maintenance()
+                _update_assembler_metrics()
+            
+            # 2. Process Finalized Traces (time-sliced)
+            backpressure.update(len(assembler.finalized_queue))
+            backpressure.drain(assembler, _process_trace)
+            _update_backpressure_metrics()
+            
+            # Full cycle work runs on the scoring interval, not on every drain tick
+            if cycle_due:
+                # 3. Update Metrics
+                ready = engine.total_traces > 100 # Simple readiness threshold
+                AIOPS_MODEL_READY.set(1 if ready else 0)
             
-            # 2. Process Finalized Traces
-            traces = assembler.get_finalized_batch()
-            for trace in traces:
-                # Add to model window
-                # Convert trace object to list of events for engine
-                # TraceAssembler stores raw events in trace.events
-                
-                # Score BEFORE learning (for anomaly detection)
-                score = engine.score_trace(trace.events)
-                SCORE_HISTORY.append(score)
-                if len(SCORE_HISTORY) > MAX_HISTORY:
-                    SCORE_HISTORY.pop(0)
-                
-                engine.add_trace(trace.events)
-                
-                # Check for expiration
-                if engine.total_traces > 2000: # Window size hardcap v1
-                    engine.expire_oldest()
-                    
-            # 3. Update Metrics
-            ready = engine.total_traces > 100 # Simple readiness threshold
-            AIOPS_MODEL_READY.set(1 if ready else 0)
+                # Calculate Integrity Score (Real Logic)
+                # Integrity = 1.0 / (1.0 + Average_Anomaly_Score)
+                # Higher anomaly score -> Lower Integrity
+                current_integrity = 1.0
+                if SCORE_HISTORY:
+                    avg_score = sum(SCORE_HISTORY) / len(SCORE_HISTORY)
+                    current_integrity = 1.0 / (1.0 + avg_score)
             
-            # Calculate Integrity Score (Real Logic)
-            # Integrity = 1.0 / (1.0 + Average_Anomaly_Score)
-            # Higher anomaly score -> Lower Integrity
-            current_integrity = 1.0
-            if SCORE_HISTORY:
-                avg_score = sum(SCORE_HISTORY) / len(SCORE_HISTORY)
-                current_integrity = 1.0 / (1.0 + avg_score)
+                AIOPS_INTEGRITY_SCORE.set(current_integrity)
             
-            AIOPS_INTEGRITY_SCORE.set(current_integrity)
+                # 4. Drift against baseline (first baseline once the model is ready)
+                if ready and not drift.has_baseline:
+                    drift.rotate_baseline()
+                else:
+                    drift.maybe_rotate()
+                drift_report = drift.report()
+                drift_summary = drift_report[0]
+                # No gauge values during warm-up: there is no baseline to drift from
+                if drift_summary["has_baseline"]:
+                    AIOPS_DRIFT_KL.set(drift_summary["kl"])
+                    AIOPS_DRIFT_JS.set(drift_summary["js"])
+            
+                # 5. Publish immutable read model for the API
+                publisher.publish(engine, _integrity_payload(current_integrity, drift_summary), drift=drift_report)
             
         except Exception as e:
             logger.error(f"Scoring loop error: {e}")
+            failed = True
             
-        await asyncio.sleep(5)
+        # Keep draining quickly while a backlog remains, yielding to the event loop between slices
+        if failed:
+            await asyncio.sleep(SCORING_INTERVAL)
+        elif assembler.finalized_queue:
+            await asyncio.sleep(BACKLOG_TICK)
+        else:
+            await asyncio.sleep(max(BACKLOG_TICK, SCORING_INTERVAL - (time.monotonic() - last_cycle)))
 
 @app.get("/health")
 async def health():
     return {"status": "ok", "service": "aiops", "model_ready": engine.total_traces > 100}
 
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match evaluation per RFC 9110 13.1.2: "*" matches any current
+    representation, otherwise any listed entity-tag matches by weak comparison.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def _snapshot_response(request: Request, snapshot: ModelSnapshot, body_of: Callable[[ModelSnapshot], bytes]) -> Response:
+    """
+    Serve a precomputed snapshot body with ETag / If-None-Match support.
+    The validator is checked first, so a 304 never touches the body.
+    """
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body_of(snapshot), media_type="application/json", headers=headers)
+
+def _state_response(request: Request, bodies_of: Callable[[ModelSnapshot], Mapping[str, bytes]], state: str) -> Response:
+    """Per-state variant: 404 for states missing from the snapshot index."""
+    snapshot = publisher.current
+    if state not in bodies_of(snapshot):
+        raise HTTPException(status_code=404, detail=f"Unknown state: {state}")
+    return _snapshot_response(request, snapshot, lambda snap: bodies_of(snap)[state])
+
 @app.get("/metrics/integrity")
-async def integrity_metrics():
+async def integrity_metrics(request: Request):
     """Operational metrics for the anomaly detection engine."""
-    ready = engine.total_traces > 100
-    return {
-        "model_ready": ready,
-        "readiness_reason": "ok" if ready else f"insufficient_data ({engine.total_traces}/100 traces)",
-        "training_window_traces": engine.total_traces,
-        "integrity_score": AIOPS_INTEGRITY_SCORE.collect()[0].samples[0].value, # Live value
-        "recent_anomaly_scores_avg": sum(SCORE_HISTORY)/len(SCORE_HISTORY) if SCORE_HISTORY else 0.0,
-        "stats": {
-            "states": len(engine.states),
-            "edges": len(engine.edge_counts),
-            "active_traces": len(assembler.traces)
-        }
-    }
+    return _snapshot_response(request, publisher.current, lambda snap: snap.integrity_body)
+
+@app.get("/model/transitions/top")
+async def model_top_transitions(request: Request):
+    """Most frequent transitions in the current window."""
+    return _snapshot_response(request, publisher.current, lambda snap: snap.top_body)
+
+@app.get("/model/states")
+async def model_states(request: Request):
+    """States with at least one outgoing transition and their out counts."""
+    return _snapshot_response(request, publisher.current, lambda snap: snap.states_body)
+
+@app.get("/model/states/{state:path}/transitions")
+async def model_state_transitions(state: str, request: Request):
+    """Outgoing distribution of a single state, served from the snapshot index."""
+    return _state_response(request, lambda snap: snap.transitions_bodies, state)
+
+@app.get("/model/states/{state:path}/drift")
+async def model_state_drift(state: str, request: Request):
+    """Divergence of a single state's outgoing distribution from the baseline."""
+    return _state_response(request, lambda snap: snap.drift_bodies, state)
+
+@app.get("/model/drift")
+async def model_drift(request: Request):
+    """Global drift and the most divergent states."""
+    return _snapshot_response(request, publisher.current, lambda snap: snap.drift_body)
+
+@app.get("/model/rare-edges")
+async def model_rare_edges(request: Request):
+    """Observed transitions whose share of the source's traffic is below the rare threshold."""
+    return _snapshot_response(request, publisher.current, lambda snap: snap.rare_body)
 
 @app.get("/metrics")
 async def prometheus_metrics():
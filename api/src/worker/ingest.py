@@ -8,6 +8,7 @@ from collections import OrderedDict
 from typing import Optional, Set
 
 from src.engine.assembler import TraceAssembler
+from src.engine.backpressure import BackpressureController
 
 logger = logging.getLogger("aiops-ingest")
 
@@ -16,10 +17,12 @@ class IngestionWorker:
         self, 
         audit_url: str, 
         assembler: TraceAssembler, 
-        cursor_path: str = "/data/cursor.json"
+        cursor_path: str = "/data/cursor.json",
+        backpressure: Optional[BackpressureController] = None
     ):
         self.audit_url = audit_url
         self.assembler = assembler
+        self.backpressure = backpressure
         self.cursor_path = cursor_path
         self.running = False
         self.current_cursor: Optional[str] = self._load_cursor()
@@ -59,7 +62,13 @@ class IngestionWorker:
                     logger.error(f"Poll cycle error: {e}")
                     await asyncio.sleep(5) # Backoff on error
                 
-                await asyncio.sleep(5) # Poll interval
+                await asyncio.sleep(self._poll_interval())
+
+    def _poll_interval(self) -> float:
+        """Base interval of 5s, stretched while the scoring backlog is deep."""
+        if self.backpressure is None:
+            return 5.0
+        return self.backpressure.poll_interval(len(self.assembler.finalized_queue))
 
     async def stop(self):
         self.running = False
@@ -81,12 +90,14 @@ class IngestionWorker:
             events = data.get("items", [])
             
             if not events:
+                self.assembler.note_poll(0)
                 return
 
             new_events_count = 0
             # Events come in DESC order (newest first). 
-            # We process them. Deduplication handles the overlap.
-            for event in events:
+            # Process oldest first so the assembler's event-time watermark
+            # advances monotonically. Deduplication handles the overlap.
+            for event in reversed(events):
                 eid = event.get("event_id")
                 if eid and eid not in self.seen_events:
                     self.seen_events[eid] = True
@@ -97,6 +108,8 @@ class IngestionWorker:
                     self.assembler.process_event(event)
                     new_events_count += 1
             
+            # Only successful polls count toward idleness; errors and 429s are unknown
+            self.assembler.note_poll(new_events_count)
             if new_events_count > 0:
                 logger.info(f"Ingested {new_events_count} new events.")
                 
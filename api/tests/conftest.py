@@ -0,0 +1,8 @@
+import pytest
+
+@pytest.fixture
+def make_trace():
+    """Factory for a trace whose events map to states '<type>:1:OK'."""
+    def _make(*types):
+        return [{"principal": {"type": t}, "action": "1", "outcome": "OK"} for t in types]
+    return _make
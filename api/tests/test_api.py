@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+
+import src.main as main
+from src.engine.markov import TransitionMatrixEngine
+from src.engine.snapshot import SnapshotPublisher
+
+@pytest.fixture
+def model(monkeypatch, make_trace):
+    """Isolated engine + publisher wired into the app, seeded with A -> B traffic."""
+    engine = TransitionMatrixEngine()
+    publisher = SnapshotPublisher()
+    monkeypatch.setattr(main, "publisher", publisher)
+    for _ in range(5):
+        engine.add_trace(make_trace("A", "B"))
+    publisher.publish(engine, {"training_window_traces": engine.total_traces})
+    return engine, publisher
+
+@pytest.fixture
+def client():
+    # No context manager: lifespan (ingest worker, scoring loop) stays off
+    return TestClient(main.app)
+
+class TestSnapshotEndpoints:
+
+    def test_etag_and_not_modified(self, model, client):
+        resp = client.get("/metrics/integrity")
+        assert resp.status_code == 200
+        etag = resp.headers["etag"]
+        assert resp.json() == {"training_window_traces": 5}
+
+        resp = client.get("/metrics/integrity", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.headers["etag"] == etag
+        assert resp.content == b""
+
+    def test_new_snapshot_changes_etag(self, model, client, make_trace):
+        engine, publisher = model
+        etag = client.get("/metrics/integrity").headers["etag"]
+
+        engine.add_trace(make_trace("A", "C"))
+        publisher.publish(engine, {"training_window_traces": engine.total_traces})
+
+        resp = client.get("/metrics/integrity", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != etag
+        assert resp.json() == {"training_window_traces": 6}
+
+    @pytest.mark.parametrize("header", [
+        "*",
+        '"other", {etag}',
+        "W/{etag}",
+        ' "other" ,W/{etag} ',
+    ])
+    def test_if_none_match_forms(self, model, client, header):
+        etag = client.get("/metrics/integrity").headers["etag"]
+        resp = client.get("/metrics/integrity", headers={"If-None-Match": header.format(etag=etag)})
+        assert resp.status_code == 304
+
+    def test_if_none_match_mismatch(self, model, client):
+        resp = client.get("/metrics/integrity", headers={"If-None-Match": '"stale", W/"older"'})
+        assert resp.status_code == 200
+
+    def test_state_transitions(self, model, client):
+        resp = client.get("/model/states/A:1:OK/transitions")
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["out_count"] == 5
+        assert [(t["dst"], t["count"]) for t in body["transitions"]] == [("B:1:OK", 5)]
+
+        etag = resp.headers["etag"]
+        resp = client.get("/model/states/A:1:OK/transitions", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+
+    def test_unknown_state(self, model, client):
+        assert client.get("/model/states/Z:1:OK/transitions").status_code == 404
+        assert client.get("/model/states/Z:1:OK/drift").status_code == 404
+
+    def test_model_payloads(self, model, client):
+        top = client.get("/model/transitions/top").json()
+        assert [(t["src"], t["dst"]) for t in top["transitions"]] == [("A:1:OK", "B:1:OK")]
+
+        assert client.get("/model/states").json()["states"] == {"A:1:OK": 5}
+        assert client.get("/model/rare-edges").json()["edges"] == []
+
+    def test_not_modified_skips_body(self, model, client):
+        _, publisher = model
+        etag = publisher.current.etag
+
+        def explode(snapshot):
+            raise AssertionError("body read on a 304")
+
+        request = type("Req", (), {"headers": {"if-none-match": etag}})()
+        resp = main._snapshot_response(request, publisher.current, explode)
+        assert resp.status_code == 304
+
+class TestScoringLoop:
+
+    def test_failing_cycle_backs_off(self, monkeypatch):
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+            if len(sleeps) >= 3:
+                raise asyncio.CancelledError
+
+        def broken():
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(main.asyncio, "sleep", fake_sleep)
+        monkeypatch.setattr(main.assembler, "maintenance", broken)
+        monkeypatch.setattr(main.backpressure, "drain", lambda *args: broken())
+
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(main.background_scoring_loop())
+        assert sleeps == [main.SCORING_INTERVAL] * 3
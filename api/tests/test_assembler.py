@@ -1,6 +1,6 @@
 import pytest
 import time
-from src.engine.assembler import TraceAssembler, Trace
+from src.engine.assembler import TraceAssembler, Trace, event_time
 
 class TestTraceAssembler:
 
@@ -72,3 +72,180 @@ class TestTraceAssembler:
         assert "t1" not in assembler.traces
         finalized = assembler.get_finalized_batch()
         assert len(finalized) == 1
+
+    def test_event_time_parsing(self):
+        assert event_time({"ts": 1000}) == 1000.0
+        assert event_time({"ts": 1700000000000}) == 1700000000.0
+        assert event_time({"ts": "1970-01-01T00:00:10Z"}) == 10.0
+        assert event_time({"ts": "garbage"}) is None
+        assert event_time({}) is None
+
+    def test_watermark_finalization(self):
+        assembler = TraceAssembler(event_gap=10, watermark_delay=2, allowed_lateness=30)
+
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1000})
+        assembler.process_event({"meta": {"correlation_id": "t2"}, "ts": 1005})
+        assert assembler.watermark() == 1003
+
+        # Watermark 1011 passes t1's deadline (1000 + 10) but not t2's (1015)
+        assembler.process_event({"meta": {"correlation_id": "t3"}, "ts": 1013})
+        assert "t1" not in assembler.traces
+        assert "t2" in assembler.traces
+        assert [t.trace_id for t in assembler.get_finalized_batch()] == ["t1"]
+
+    def test_watermark_extended_by_new_event(self):
+        assembler = TraceAssembler(event_gap=10, watermark_delay=0)
+
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1000})
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1008})
+        assembler.process_event({"meta": {"correlation_id": "t2"}, "ts": 1012})
+
+        # t1's first deadline (1010) is stale; the live one is 1018
+        assert "t1" in assembler.traces
+        assembler.process_event({"meta": {"correlation_id": "t2"}, "ts": 1018})
+        assert "t1" not in assembler.traces
+
+    def test_late_events_dropped(self):
+        assembler = TraceAssembler(event_gap=100, watermark_delay=0, allowed_lateness=5)
+
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1000})
+        assembler.process_event({"meta": {"correlation_id": "t2"}, "ts": 990})
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 990})
+
+        # Late for a new trace, accepted into an open one
+        assert "t2" not in assembler.traces
+        assert len(assembler.traces["t1"].events) == 2
+        assert assembler.late_events == 1
+
+    def test_idle_watermark_advances(self):
+        assembler = TraceAssembler(event_gap=10, watermark_delay=0, idle_polls=2)
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1000})
+
+        now = time.time()
+        # A single empty poll is not enough to call the source idle
+        assembler.note_poll(0, now=now)
+        assert assembler.advance_watermark(now + 60) == 0
+
+        assembler.note_poll(0, now=now + 5)
+        assert assembler.advance_watermark(now + 5) == 0
+        assert assembler.advance_watermark(now + 15) == 1
+        assert "t1" not in assembler.traces
+
+    def test_slow_polls_do_not_advance_watermark(self):
+        assembler = TraceAssembler(event_gap=10, watermark_delay=0)
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1000})
+
+        # Backed-off poller: long wall gaps, but every poll brought new events
+        now = time.time()
+        for i in range(3):
+            assembler.note_poll(1, now=now + 30 * i)
+        assert assembler.advance_watermark(now + 120) == 0
+
+        # A new event ends an idle run
+        assembler.note_poll(0, now=now)
+        assembler.note_poll(0, now=now)
+        assembler.process_event({"meta": {"correlation_id": "t2"}, "ts": 1001})
+        assert assembler.advance_watermark(now + 120) == 0
+        assert "t1" in assembler.traces
+
+    def test_terminal_detector_finalizes_early(self):
+        assembler = TraceAssembler(terminal_detector=lambda trace: trace.events[-1].get("action") == "logout")
+
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1, "action": "login"})
+        assert "t1" in assembler.traces
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 2, "action": "logout"})
+
+        assert "t1" not in assembler.traces
+        assert assembler.early_finalized == 1
+        assert len(assembler.get_finalized_batch()[0].events) == 2
+
+    def test_sub_second_epochs(self):
+        assert event_time({"ts": 1700000000123456}) == pytest.approx(1700000000.123456)
+        assert event_time({"ts": 1700000000123456789}) == pytest.approx(1700000000.123456789)
+
+    def test_future_timestamp_does_not_advance_watermark(self):
+        now = time.time()
+        assembler = TraceAssembler(event_gap=10, watermark_delay=2, allowed_lateness=30)
+
+        assembler.process_event({"meta": {"correlation_id": "open"}, "ts": now})
+        # One event stamped a year ahead
+        assembler.process_event({"meta": {"correlation_id": "skewed"}, "ts": now + 365 * 86400})
+        assert assembler.future_events == 1
+        assert assembler.max_event_time == now
+
+        for i in range(100):
+            assembler.process_event({"meta": {"correlation_id": f"t{i}"}, "ts": now + 1})
+
+        assert assembler.late_events == 0
+        assert "open" in assembler.traces
+        assert len(assembler.traces) == 102
+
+    def test_terminal_close_advances_watermark(self):
+        assembler = TraceAssembler(
+            event_gap=10, watermark_delay=2,
+            terminal_detector=lambda trace: trace.events[-1].get("action") == "logout",
+        )
+
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1000, "action": "login"})
+        assembler.process_event({"meta": {"correlation_id": "t2"}, "ts": 1001, "action": "login"})
+        assembler.process_event({"meta": {"correlation_id": "t2"}, "ts": 1050, "action": "logout"})
+
+        assert assembler.max_event_time == 1050
+        assert "t1" not in assembler.traces
+        assert [t.trace_id for t in assembler.get_finalized_batch()] == ["t2", "t1"]
+
+    def test_mixed_timestamp_ordering(self):
+        assembler = TraceAssembler()
+        for event in [
+            {"meta": {"correlation_id": "t1"}, "event_id": "c", "ts": "1970-01-01T00:16:50Z"},
+            {"meta": {"correlation_id": "t1"}, "event_id": "x"},
+            {"meta": {"correlation_id": "t1"}, "event_id": "a", "ts": 1000},
+            {"meta": {"correlation_id": "t1"}, "event_id": "b", "ts": "1005"},
+        ]:
+            assembler.process_event(event)
+
+        trace = assembler.traces["t1"]
+        assert [e["event_id"] for e in trace.events] == ["a", "b", "c", "x"]
+        assert trace.duration() == 10.0
+
+    def test_ttl_backstop_only_for_untimed_traces(self):
+        assembler = TraceAssembler(trace_ttl=0.1)
+        now = time.time()
+        assembler.process_event({"meta": {"correlation_id": "timed"}, "ts": now})
+        assembler.process_event({"meta": {"correlation_id": "untimed"}})
+
+        time.sleep(0.2)
+        assembler.maintenance()
+
+        assert "untimed" not in assembler.traces
+        assert "timed" in assembler.traces
+
+    def test_events_after_terminal_resume_trace(self):
+        assembler = TraceAssembler(
+            event_gap=10, watermark_delay=0,
+            terminal_detector=lambda trace: trace.events[-1].get("action") == "logout",
+        )
+        for ts, action in [(1000, "login"), (1001, "logout"), (1002, "cleanup")]:
+            assembler.process_event({"meta": {"correlation_id": "t0"}, "ts": ts, "action": action})
+
+        # The fragment was handed off at the terminal state...
+        fragment, = assembler.get_finalized_batch()
+        assert [e["action"] for e in fragment.events] == ["login", "logout"]
+
+        # ...and the later event resumed it rather than starting a new fragment
+        trace = assembler.traces["t0"]
+        assert assembler.resumed_traces == 1
+        assert [e["action"] for e in trace.events] == ["login", "logout", "cleanup"]
+        assert [e["action"] for e in trace.learnable_events()] == ["logout", "cleanup"]
+
+    def test_early_close_forgotten_after_event_gap(self):
+        assembler = TraceAssembler(
+            event_gap=10, watermark_delay=0,
+            terminal_detector=lambda trace: trace.events[-1].get("action") == "logout",
+        )
+        assembler.process_event({"meta": {"correlation_id": "t0"}, "ts": 1000, "action": "logout"})
+        assembler.process_event({"meta": {"correlation_id": "t1"}, "ts": 1011, "action": "login"})
+        assembler.process_event({"meta": {"correlation_id": "t0"}, "ts": 1011, "action": "login"})
+
+        assert assembler.resumed_traces == 0
+        assert len(assembler.traces["t0"].events) == 1
@@ -0,0 +1,85 @@
+import pytest
+import time
+from src.engine.assembler import TraceAssembler
+from src.engine.backpressure import BackpressureController
+
+def _finalize(assembler, trace_id, action="login", outcome="OK"):
+    assembler.process_event({"meta": {"correlation_id": trace_id}, "action": action, "outcome": outcome})
+    assembler._finalize(trace_id)
+
+class TestBackpressure:
+
+    def test_overload_hysteresis(self):
+        bp = BackpressureController(high_watermark=100, low_watermark=20)
+
+        bp.update(50)
+        assert not bp.overloaded
+        assert bp.sample_rate == 1.0
+
+        bp.update(200)
+        assert bp.overloaded
+        assert bp.sample_rate == pytest.approx(0.1)
+
+        # Stays overloaded between the watermarks
+        bp.update(50)
+        assert bp.overloaded
+
+        bp.update(20)
+        assert not bp.overloaded
+        assert bp.sample_rate == 1.0
+
+    def test_stratified_sampling(self):
+        assembler = TraceAssembler()
+        bp = BackpressureController(high_watermark=10, low_watermark=1, min_sample_rate=0.25)
+        bp.update(100)
+        assert bp.sample_rate == 0.25
+
+        for i in range(8):
+            _finalize(assembler, f"ok-{i}")
+        _finalize(assembler, "fail-0", outcome="DENIED")
+
+        learned = [t.trace_id for t in assembler.get_finalized_batch() if bp.should_learn(t)]
+
+        # Every 4th trace of the common stratum, and the first of the rare one
+        assert learned == ["ok-0", "ok-4", "fail-0"]
+        assert bp.learn_skipped == 6
+
+    def test_drain_respects_budget(self):
+        assembler = TraceAssembler()
+        for i in range(5):
+            _finalize(assembler, f"t{i}")
+
+        # Each trace costs a tick's whole budget, so each drain handles exactly one
+        seen = []
+        def slow_handler(trace):
+            seen.append(trace)
+            time.sleep(0.02)
+
+        bp = BackpressureController(tick_budget=0.01)
+        assert bp.drain(assembler, slow_handler) == 1
+        assert len(assembler.finalized_queue) == 4
+
+        bp.tick_budget = 1.0
+        assert bp.drain(assembler, seen.append) == 4
+        assert [t.trace_id for t in seen] == [f"t{i}" for i in range(5)]
+
+    def test_rejects_non_positive_budget(self):
+        with pytest.raises(ValueError):
+            BackpressureController(tick_budget=0)
+
+    def test_poll_interval_scales_with_depth(self):
+        bp = BackpressureController(high_watermark=100, low_watermark=20, base_poll_interval=5.0, max_poll_interval=12.0)
+
+        assert bp.poll_interval(10) == 5.0
+        assert bp.poll_interval(100) == 10.0
+        assert bp.poll_interval(10000) == 12.0
+
+    def test_bounded_finalized_queue(self):
+        assembler = TraceAssembler(max_finalized=2)
+        for i in range(3):
+            _finalize(assembler, f"t{i}")
+
+        assert assembler.dropped_finalized == 1
+        assert assembler.pop_finalized().trace_id == "t1"
+        assert assembler.pop_finalized().trace_id == "t2"
+        assert assembler.pop_finalized() is None
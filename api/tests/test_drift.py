@@ -0,0 +1,133 @@
+import math
+import pytest
+from src.engine.markov import TransitionMatrixEngine
+from src.engine.drift import DriftDetector
+
+def _brute_kl(drift, state):
+    row = drift.live[state]
+    n = sum(row.values())
+    return sum((c / n) * math.log((c / n) / math.exp(drift._log_p(state, dst))) for dst, c in row.items())
+
+class TestDriftDetector:
+
+    def _trained(self, make_trace):
+        engine = TransitionMatrixEngine()
+        drift = DriftDetector(alpha=engine.alpha)
+        drift.attach(engine)
+        for _ in range(8):
+            engine.add_trace(make_trace("A", "B"))
+        for _ in range(2):
+            engine.add_trace(make_trace("A", "C"))
+        drift.rotate_baseline(now=0)
+        return engine, drift
+
+    def test_no_drift_against_own_baseline(self, make_trace):
+        engine, drift = self._trained(make_trace)
+
+        assert drift.state_js("A:1:OK") == pytest.approx(0.0)
+        assert drift.global_js() == pytest.approx(0.0)
+        assert drift.state_kl("A:1:OK") == pytest.approx(_brute_kl(drift, "A:1:OK"))
+
+    def test_incremental_kl_matches_recompute(self, make_trace):
+        engine, drift = self._trained(make_trace)
+
+        for _ in range(10):
+            engine.add_trace(make_trace("A", "C"))
+        engine.add_trace(make_trace("A", "D"))
+        for _ in range(5):
+            engine.expire_oldest()
+
+        assert drift.live["A:1:OK"] == {"B:1:OK": 3, "C:1:OK": 12, "D:1:OK": 1}
+        assert drift.state_kl("A:1:OK") == pytest.approx(_brute_kl(drift, "A:1:OK"))
+        assert drift.global_kl() == pytest.approx(drift.state_kl("A:1:OK"))
+        assert drift.state_js("A:1:OK") > 0.1
+
+    def test_new_state_is_maximally_divergent(self, make_trace):
+        engine, drift = self._trained(make_trace)
+        engine.add_trace(make_trace("X", "Y"))
+
+        assert drift.state_js("X:1:OK") == 1.0
+        summary, per_state = drift.report(top_n=1)
+        assert summary["top_states"][0]["state"] == "X:1:OK"
+        assert set(per_state) == {"A:1:OK", "X:1:OK"}
+
+    def test_state_leaving_window(self, make_trace):
+        engine, drift = self._trained(make_trace)
+        while engine.window_traces:
+            engine.expire_oldest()
+
+        assert drift.state_kl("A:1:OK") is None
+        assert drift.live_total == 0
+        assert drift.global_kl() == 0.0
+
+    def test_rotation_guarded_by_drift(self, make_trace):
+        engine, drift = self._trained(make_trace)
+        drift.rotation_interval = 10
+        drift.rotation_max_drift = 0.1
+
+        assert not drift.maybe_rotate(now=5)
+
+        for _ in range(50):
+            engine.add_trace(make_trace("A", "D"))
+        assert drift.global_kl() > 0.1
+        assert not drift.maybe_rotate(now=20)
+
+        drift.rotation_max_drift = 10.0
+        assert drift.maybe_rotate(now=20)
+        assert drift.baseline_at == 20
+        assert drift.global_js() == pytest.approx(0.0)
+
+    def test_running_js_matches_recompute(self, make_trace):
+        engine, drift = self._trained(make_trace)
+        for _ in range(6):
+            engine.add_trace(make_trace("A", "C"))
+        engine.add_trace(make_trace("X", "Y"))
+        engine.add_trace(make_trace("B", "C"))
+        assert drift.global_js() > 0
+        engine.expire_oldest()
+
+        expected = sum(
+            drift._compute_js(s) * n for s, n in drift.live_out.items()
+        ) / drift.live_total
+        assert drift.global_js() == pytest.approx(expected)
+        # Only touched states were recomputed; clean ones keep their cached share
+        assert not drift._dirty
+
+    def test_periodic_resync(self, make_trace):
+        engine = TransitionMatrixEngine()
+        drift = DriftDetector(alpha=engine.alpha, resync_interval=3)
+        drift.attach(engine)
+        for _ in range(4):
+            engine.add_trace(make_trace("A", "B"))
+        drift.rotate_baseline(now=0)
+        engine.add_trace(make_trace("A", "C"))
+
+        # Corrupt the running sums; the next resync rebuilds them from the mirror
+        drift._global_kl_mass += 5.0
+        drift._sum_clogc["A:1:OK"] += 1.0
+        engine.add_trace(make_trace("A", "C"))
+        engine.add_trace(make_trace("A", "C"))
+
+        assert drift._deltas_since_resync == 0
+        assert drift.state_kl("A:1:OK") == pytest.approx(_brute_kl(drift, "A:1:OK"))
+        assert drift.global_kl() == pytest.approx(drift.state_kl("A:1:OK"))
+
+    def test_no_divergence_before_baseline(self, make_trace):
+        engine = TransitionMatrixEngine()
+        drift = DriftDetector(alpha=engine.alpha)
+        drift.attach(engine)
+        engine.add_trace(make_trace("A", "B"))
+
+        assert drift.state_js("A:1:OK") is None
+        assert drift.state_kl("A:1:OK") is None
+        assert drift.global_js() is None
+        assert drift.global_kl() is None
+
+        summary, per_state = drift.report()
+        assert summary["has_baseline"] is False
+        assert summary["js"] is None and summary["kl"] is None
+        assert summary["top_states"] == []
+        assert per_state["A:1:OK"]["js"] is None
+
+        drift.rotate_baseline(now=0)
+        assert drift.global_js() == pytest.approx(0.0)
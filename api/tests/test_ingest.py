@@ -0,0 +1,38 @@
+import asyncio
+import httpx
+import pytest
+from src.engine.assembler import TraceAssembler
+from src.worker.ingest import IngestionWorker
+
+def _poll(worker, status, items=None):
+    def handler(request):
+        return httpx.Response(status, json={"items": items or []})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await worker._poll_cycle(client)
+    asyncio.run(run())
+
+class TestIngestionWorker:
+
+    def test_polls_drive_idleness(self, tmp_path, monkeypatch):
+        assembler = TraceAssembler()
+        worker = IngestionWorker("http://audit", assembler, cursor_path=str(tmp_path / "cursor.json"))
+
+        async def no_sleep(delay):
+            return None
+        monkeypatch.setattr("src.worker.ingest.asyncio.sleep", no_sleep)
+
+        _poll(worker, 200)
+        assert assembler._empty_polls == 1
+
+        # Rate-limited polls say nothing about the source
+        _poll(worker, 429)
+        assert assembler._empty_polls == 1
+
+        _poll(worker, 200, [{"event_id": "e1", "meta": {"correlation_id": "t1"}, "ts": 1000}])
+        assert assembler._empty_polls == 0
+
+        # Only duplicates: no new data, counts as empty
+        _poll(worker, 200, [{"event_id": "e1", "meta": {"correlation_id": "t1"}, "ts": 1000}])
+        assert assembler._empty_polls == 1
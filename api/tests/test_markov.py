@@ -1,4 +1,5 @@
 import pytest
+from src.engine.assembler import TraceAssembler
 from src.engine.markov import TransitionMatrixEngine
 
 class TestMarkovEngine:
@@ -80,3 +81,49 @@ class TestMarkovEngine:
         score_anomaly = engine.score_trace(anomaly)
         
         assert score_anomaly > score_normal
+
+    def test_end_of_trace_learning(self):
+        engine = TransitionMatrixEngine()
+        trace = [
+            {"principal": {"type": "user"}, "action": "login", "outcome": "OK"},
+            {"principal": {"type": "user"}, "action": "logout", "outcome": "OK"}
+        ]
+        for _ in range(30):
+            engine.add_trace(trace)
+
+        assert engine.end_probability("user:logout:OK") > 0.95
+        assert engine.end_probability("user:login:OK") == 0.0
+        assert engine.is_end_of_trace(trace)
+        assert not engine.is_end_of_trace(trace[:1])
+
+        # Not enough support after the window slides
+        for _ in range(15):
+            engine.expire_oldest()
+        assert engine.visit_counts["user:logout:OK"] == 15
+        assert not engine.is_end_of_trace(trace)
+
+    def test_terminal_estimate_recovers_from_continuations(self):
+        engine = TransitionMatrixEngine()
+        assembler = TraceAssembler(
+            event_gap=10, watermark_delay=0,
+            terminal_detector=lambda trace: engine.is_end_of_trace(trace.events),
+        )
+        login = {"principal": {"type": "user"}, "action": "login", "outcome": "OK"}
+        logout = {"principal": {"type": "user"}, "action": "logout", "outcome": "OK"}
+        cleanup = {"principal": {"type": "user"}, "action": "cleanup", "outcome": "OK"}
+        for _ in range(30):
+            engine.add_trace([login, logout])
+        p_before = engine.end_probability("user:logout:OK")
+
+        for ts, event in [(1000, login), (1001, logout), (1002, cleanup)]:
+            assembler.process_event({**event, "meta": {"correlation_id": "t0"}, "ts": ts})
+        assembler.process_event({"meta": {"correlation_id": "later"}, "ts": 1100})
+
+        learned = [t.learnable_events() for t in assembler.get_finalized_batch()]
+        for events in learned:
+            engine.add_trace(events)
+
+        assert engine.edge_counts[("user:logout:OK", "user:cleanup:OK")] == 1
+        assert engine.end_probability("user:logout:OK") < p_before
+        # login -> logout was learned once, by the early-closed fragment
+        assert engine.edge_counts[("user:login:OK", "user:logout:OK")] == 31
@@ -0,0 +1,85 @@
+import json
+import pytest
+from src.engine.markov import TransitionMatrixEngine
+from src.engine.snapshot import SnapshotPublisher, build_snapshot
+
+class TestModelSnapshot:
+
+    def test_outgoing_index(self, make_trace):
+        engine = TransitionMatrixEngine()
+        for _ in range(9):
+            engine.add_trace(make_trace("A", "B"))
+        engine.add_trace(make_trace("A", "C"))
+
+        snapshot = build_snapshot(engine, 1, {"integrity_score": 1.0})
+        transitions = snapshot.transitions_for("A:1:OK")
+
+        assert [t.dst for t in transitions] == ["B:1:OK", "C:1:OK"]
+        assert transitions[0].count == 9
+        assert transitions[0].share == pytest.approx(0.9)
+        assert transitions[0].probability == engine.get_probability("A:1:OK", "B:1:OK")
+        assert snapshot.out_counts["A:1:OK"] == 10
+        assert snapshot.transitions_for("Z:1:OK") is None
+
+    def test_top_and_rare_edges(self, make_trace):
+        engine = TransitionMatrixEngine()
+        for _ in range(30):
+            engine.add_trace(make_trace("A", "B"))
+        engine.add_trace(make_trace("A", "C"))
+
+        snapshot = build_snapshot(engine, 1, {}, top_n=1, rare_share=0.05)
+
+        assert len(snapshot.top_transitions) == 1
+        assert snapshot.top_transitions[0].dst == "B:1:OK"
+        assert [(t.src, t.dst) for t in snapshot.rare_edges] == [("A:1:OK", "C:1:OK")]
+
+    def test_expired_edges_excluded(self, make_trace):
+        engine = TransitionMatrixEngine()
+        engine.add_trace(make_trace("A", "B"))
+        engine.expire_oldest()
+
+        snapshot = build_snapshot(engine, 1, {})
+        assert snapshot.transitions_for("A:1:OK") is None
+        assert snapshot.top_transitions == ()
+
+    def test_snapshot_is_isolated_from_engine(self, make_trace):
+        engine = TransitionMatrixEngine()
+        engine.add_trace(make_trace("A", "B"))
+        snapshot = build_snapshot(engine, 1, {})
+
+        engine.add_trace(make_trace("A", "B"))
+        assert snapshot.transitions_for("A:1:OK")[0].count == 1
+        with pytest.raises(TypeError):
+            snapshot.outgoing["X"] = ()
+
+    def test_publisher_versioning(self, make_trace):
+        engine = TransitionMatrixEngine()
+        publisher = SnapshotPublisher()
+
+        first = publisher.publish(engine, {"edges": 0})
+        assert first.version == 1
+
+        # Unchanged content keeps version and ETag
+        again = publisher.publish(engine, {"edges": 0})
+        assert again is first
+
+        engine.add_trace(make_trace("A", "B"))
+        second = publisher.publish(engine, {"edges": 1})
+        assert second.version == 2
+        assert second.etag != first.etag
+
+    def test_bodies_serialized_once(self, make_trace):
+        engine = TransitionMatrixEngine()
+        for _ in range(30):
+            engine.add_trace(make_trace("A", "B"))
+        engine.add_trace(make_trace("A", "C"))
+
+        per_state = {"A:1:OK": {"kl": 0.0, "js": 0.0, "live_out": 31, "baseline_out": 31}}
+        snapshot = build_snapshot(engine, 3, {}, top_n=1, drift=({"js": 0.0}, per_state))
+
+        assert json.loads(snapshot.top_body)["transitions"][0]["dst"] == "B:1:OK"
+        assert json.loads(snapshot.states_body) == {"version": 3, "states": {"A:1:OK": 31}}
+        assert [e["dst"] for e in json.loads(snapshot.rare_body)["edges"]] == ["C:1:OK"]
+        assert json.loads(snapshot.drift_body) == {"version": 3, "js": 0.0}
+        assert json.loads(snapshot.transitions_bodies["A:1:OK"])["out_count"] == 31
+        assert json.loads(snapshot.drift_bodies["A:1:OK"])["live_out"] == 31